@@ -7,7 +7,12 @@ import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import pandas as pd
 import numpy as np
-from db_utils import get_solar_data
+from db_utils import get_solar_data, get_kpis, refresh_kpis
+from scheduler import create_scheduler, get_job_runs, KPI_INTERVAL, TICK_SECONDS
+import os
+from hydrogen import hydrogen_production, validate_params as validate_h2_params, DEFAULT_PARAMS as H2_DEFAULTS
+from sizing import optimize_sizing, DEFAULT_COSTS as SIZING_COSTS
+import time
 import base64
 import io
 import json
@@ -23,41 +28,61 @@ dash_app = dash.Dash(__name__, server=app, url_base_pathname='/dashboard/', exte
 dash_app.title = "Dashboard Solar - Proyecto Hidrógeno"
 
 # Obtener fechas mínimas y máximas para inicializar el selector
-_df_init = get_solar_data()
-if not _df_init.empty and 'timestamp' in _df_init.columns:
-    min_date = _df_init['timestamp'].min().date()
-    max_date = _df_init['timestamp'].max().date()
+_ts_init = get_solar_data(as_arrays=True)['timestamp']
+if len(_ts_init):
+    min_date = _ts_init.min().astype('datetime64[D]').item()
+    max_date = _ts_init.max().astype('datetime64[D]').item()
 else:
     # Valores por defecto si no hay datos
     min_date = datetime.now().date()
     max_date = datetime.now().date()
-del _df_init
+del _ts_init
+
+def daily_mean(data, column="slrw_avg"):
+    """Promedio diario de una columna a partir del modo de arreglos de get_solar_data"""
+    values = data[column]
+    valid = ~np.isnan(values)
+    days, index = np.unique(data['timestamp'][valid].astype('datetime64[D]'), return_inverse=True)
+    means = np.bincount(index, weights=values[valid]) / np.bincount(index)
+    return days, means
+
+# Planificador de ETL y KPIs (un solo líder entre workers de gunicorn)
+scheduler = create_scheduler()
+if os.getenv("SCHEDULER_ENABLED", "1") == "1":
+    scheduler.start()
 
 # ==================== RUTAS FLASK ====================
 
 @app.route('/')
 def home():
     """Página de inicio con resumen de métricas clave"""
-    # Obtener métricas básicas
-    df_recent = get_solar_data(column="slrw_avg")
-    if not df_recent.empty:
-        df_recent = df_recent.tail(24)  # Últimas 24 horas
-        avg_irradiance = df_recent['slrw_avg'].mean()
-        max_irradiance = df_recent['slrw_avg'].max()
-        total_energy = df_recent['slrw_avg'].sum() * 2 * (10/60) / 1000  # kWh para panel de 2m²
-    else:
-        avg_irradiance = max_irradiance = total_energy = 0
+    # Métricas materializadas por el planificador (últimas 24 horas, panel de 2m²);
+    # se recalculan aquí solo si el planificador no las actualizó en un intervalo
+    # más un tick de margen (la tarea corre en el primer tick tras vencer)
+    kpis = get_kpis()
+    max_age = pd.Timedelta(seconds=KPI_INTERVAL + TICK_SECONDS)
+    if kpis is None or pd.Timestamp(kpis['updated_at']) < pd.Timestamp.now() - max_age:
+        kpis = refresh_kpis()
     
     return render_template('home.html', 
-                         avg_irradiance=avg_irradiance,
-                         max_irradiance=max_irradiance,
-                         total_energy=total_energy)
+                         avg_irradiance=kpis['avg_irradiance'],
+                         max_irradiance=kpis['max_irradiance'],
+                         total_energy=kpis['total_energy'])
 
 @app.route('/calculations')
 def calculations():
     """Página de cálculos avanzados"""
     return render_template('calculations.html')
 
+@app.route('/api/scheduler-status')
+def scheduler_status():
+    """API de monitoreo de las tareas programadas"""
+    return jsonify({
+        'leader': scheduler.is_leader,
+        'jobs': get_job_runs(),
+        'kpis': get_kpis()
+    })
+
 @app.route('/api/solar-efficiency', methods=['POST'])
 def calculate_solar_efficiency():
     """API para cálculos de eficiencia solar"""
@@ -129,31 +154,75 @@ def trends_analysis():
     end_date = datetime.now()
     start_date = end_date - timedelta(days=30)
     
-    df = get_solar_data(start_date=start_date, end_date=end_date, column="slrw_avg")
+    data = get_solar_data(start_date=start_date, end_date=end_date, column="slrw_avg", as_arrays=True)
     
-    if df.empty:
+    if not len(data['timestamp']):
         return jsonify({'error': 'No hay datos disponibles'})
     
     # Análisis de tendencias
-    df['date'] = pd.to_datetime(df['timestamp']).dt.date
-    daily_avg = df.groupby('date')['slrw_avg'].mean().reset_index()
+    days, y = daily_mean(data)
     
     # Calcular tendencia lineal
-    x = np.arange(len(daily_avg))
-    y = daily_avg['slrw_avg'].values
+    x = np.arange(len(days))
     slope, intercept = np.polyfit(x, y, 1)
     
     # Predicción para próximos 7 días
-    future_days = np.arange(len(daily_avg), len(daily_avg) + 7)
+    future_days = np.arange(len(days), len(days) + 7)
     predictions = slope * future_days + intercept
     
     return jsonify({
         'trend_slope': round(slope, 2),
-        'current_avg': round(daily_avg['slrw_avg'].iloc[-1], 2),
+        'current_avg': round(y[-1], 2),
         'predictions': [round(p, 2) for p in predictions],
         'trend_direction': 'increasing' if slope > 0 else 'decreasing'
     })
 
+@app.route('/api/hydrogen-production', methods=['POST'])
+def hydrogen_production_api():
+    """API para estimar la producción de hidrógeno sobre el histórico"""
+    data = request.get_json() or {}
+    
+    try:
+        params = validate_h2_params({key: data.get(key, default) for key, default in H2_DEFAULTS.items()})
+        result = hydrogen_production(data.get('start_date'), data.get('end_date'), **params)
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({
+        'total_kg': round(result['total_kg'], 4),
+        'pv_energy_kwh': round(result['pv_energy_kwh'], 3),
+        'operating_hours': round(result['operating_hours'], 2),
+        'daily_kg': {d.strftime('%Y-%m-%d'): round(v, 4) for d, v in result['daily'].items()},
+        'monthly_kg': {d.strftime('%Y-%m'): round(v, 4) for d, v in result['monthly'].items()},
+        'parameters': params
+    })
+
+@app.route('/api/sizing', methods=['POST'])
+def sizing_api():
+    """API para barrido de dimensionamiento sobre el histórico (frente de Pareto energía/costo)"""
+    data = request.get_json() or {}
+    
+    try:
+        grid = {
+            'panel_areas': [float(v) for v in data.get('panel_areas', [2])],
+            'panel_efficiencies': [float(v) for v in data.get('panel_efficiencies', [0.15])],
+            'temp_coefficients': [float(v) for v in data.get('temp_coefficients', [-0.004])],
+            'tilts': [float(v) for v in data.get('tilts', [0])],
+        }
+        costs = {key: float(data.get(key, default)) for key, default in SIZING_COSTS.items()}
+        
+        started = time.perf_counter()
+        result = optimize_sizing(**grid, start_date=data.get('start_date'), end_date=data.get('end_date'),
+                                 ambient_temperature=float(data.get('temperature', 25)), **costs)
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if result['samples'] == 0:
+        return jsonify({'error': 'No hay datos disponibles'})
+    
+    result['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    return jsonify(result)
+
 # ==================== LAYOUT DASH ====================
 
 dash_app.layout = dbc.Container([
@@ -276,6 +345,59 @@ dash_app.layout = dbc.Container([
         ], width=12)
     ]),
 
+    # Sección: Producción de hidrógeno
+    dbc.Row([
+        dbc.Col([
+            dbc.Card([
+                dbc.CardHeader(html.H4("Producción Estimada de Hidrógeno")),
+                dbc.CardBody([
+                    dbc.Row([
+                        dbc.Col([
+                            html.Label("Potencia nominal del electrolizador (kW)"),
+                            dcc.Input(
+                                id='h2-rated-power',
+                                type='number',
+                                value=H2_DEFAULTS['rated_power_kw'],
+                                min=0.01,
+                                max=1000,
+                                step=0.01,
+                                style={'width': '100%'}
+                            )
+                        ], width=4),
+                        dbc.Col([
+                            html.Label("Carga mínima (%)"),
+                            dcc.Input(
+                                id='h2-min-load',
+                                type='number',
+                                value=H2_DEFAULTS['min_load'] * 100,
+                                min=0,
+                                max=100,
+                                step=1,
+                                style={'width': '100%'}
+                            )
+                        ], width=4),
+                        dbc.Col([
+                            html.Label("Área del panel (m²)"),
+                            dcc.Input(
+                                id='h2-panel-area',
+                                type='number',
+                                value=H2_DEFAULTS['panel_area'],
+                                min=0.1,
+                                max=100,
+                                step=0.1,
+                                style={'width': '100%'}
+                            )
+                        ], width=4)
+                    ], className="mb-4"),
+                    dbc.Row([
+                        dbc.Col(dcc.Graph(id='h2-graph'), width=8),
+                        dbc.Col(html.Div(id='h2-metrics'), width=4)
+                    ])
+                ])
+            ], className="mb-4")
+        ], width=12)
+    ]),
+
     # Sección: Simulación climática
     dbc.Row([
         dbc.Col([
@@ -330,8 +452,8 @@ dash_app.layout = dbc.Container([
     [Input('date-range', 'start_date'), Input('date-range', 'end_date'), Input('data-type', 'value')]
 )
 def update_graph_and_metrics(start_date, end_date, data_type):
-    df = get_solar_data(start_date, end_date, column=data_type)
-    if df.empty:
+    df = get_solar_data(start_date, end_date, column=data_type) if data_type else None
+    if df is None or df.empty:
         fig = px.line()
         metrics = html.Div("No hay datos para el rango seleccionado.")
         return fig, metrics
@@ -359,23 +481,21 @@ def update_graph_and_metrics(start_date, end_date, data_type):
     [Input('date-range', 'start_date'), Input('date-range', 'end_date')]
 )
 def update_trends(start_date, end_date):
-    df = get_solar_data(start_date, end_date, column="slrw_avg")
-    if df.empty:
+    data = get_solar_data(start_date, end_date, column="slrw_avg", as_arrays=True)
+    if not len(data['timestamp']):
         fig = px.line()
         metrics = html.Div("No hay datos para análisis de tendencias.")
         return fig, metrics
     
     # Análisis de tendencias
-    df['date'] = pd.to_datetime(df['timestamp']).dt.date
-    daily_avg = df.groupby('date')['slrw_avg'].mean().reset_index()
+    days, y = daily_mean(data)
     
-    fig = px.line(daily_avg, x='date', y='slrw_avg', title="Tendencia Diaria de Irradiancia")
+    fig = px.line(x=days, y=y, title="Tendencia Diaria de Irradiancia", labels={'x': 'date', 'y': 'slrw_avg'})
     fig.update_traces(line=dict(width=3, color='#00dca0'))
     fig.update_layout(margin=dict(l=20, r=20, t=40, b=20), plot_bgcolor="#222", paper_bgcolor="#222", font_color="#fff")
     
     # Calcular tendencia
-    x = np.arange(len(daily_avg))
-    y = daily_avg['slrw_avg'].values
+    x = np.arange(len(days))
     slope, intercept = np.polyfit(x, y, 1)
     
     trend_direction = "↗️ Aumentando" if slope > 0 else "↘️ Disminuyendo"
@@ -385,7 +505,7 @@ def update_trends(start_date, end_date):
             html.H5("Análisis de Tendencia", className="card-title"),
             html.P(f"Dirección: {trend_direction}", className="card-text", style={"color": "#00dca0", "fontWeight": "bold"}),
             html.P(f"Pendiente: {slope:.2f} W/m²/día", className="card-text"),
-            html.P(f"Promedio actual: {daily_avg['slrw_avg'].iloc[-1]:.2f} W/m²", className="card-text"),
+            html.P(f"Promedio actual: {y[-1]:.2f} W/m²", className="card-text"),
         ])
     ], className="mt-3")
     
@@ -398,20 +518,27 @@ def update_trends(start_date, end_date):
 )
 def update_energy_calculation(records_limit, panel_area, n_clicks, table_children):
     ctx = dash.callback_context
-    df = get_solar_data(column="slrw_avg")
-    if df.empty:
+    data = get_solar_data(column="slrw_avg", epoch=True, as_arrays=True)
+    if not len(data['timestamp']):
         fig = px.line()
         metrics = html.Div("No hay datos disponibles para el cálculo de energía.")
         table = html.Div("No hay datos para mostrar en la tabla.")
         return fig, metrics, table, None
     
-    df = df.tail(records_limit).copy()
-    df["timestamp"] = pd.to_datetime(df["timestamp"])
-    df["delta_horas"] = df["timestamp"].diff().dt.total_seconds() / 3600
-    df["slrw_avg_shift"] = df["slrw_avg"].shift()
-    df["energia_tramo_Wh"] = ((df["slrw_avg"] + df["slrw_avg_shift"]) / 2) * df["delta_horas"]
+    # Método del trapecio sobre los últimos registros (solo se arma un DataFrame para la tabla)
+    ts = data['timestamp'][-records_limit:]
+    irradiance = data['slrw_avg'][-records_limit:]
+    delta_horas = np.concatenate([[np.nan], np.diff(ts) / 3600])
+    irradiance_shift = np.concatenate([[np.nan], irradiance[:-1]])
+    energia_tramo = (irradiance + irradiance_shift) / 2 * delta_horas
+    df = pd.DataFrame({
+        "timestamp": ts.astype('datetime64[s]'),
+        "slrw_avg": irradiance,
+        "delta_horas": delta_horas,
+        "energia_tramo_Wh": energia_tramo
+    })
     
-    energia_total_Wh = df["energia_tramo_Wh"].sum()
+    energia_total_Wh = np.nansum(energia_tramo)
     energia_total_kWh = energia_total_Wh / 1000
     energia_panel_Wh = energia_total_Wh * panel_area
     energia_panel_kWh = energia_panel_Wh / 1000
@@ -436,7 +563,6 @@ def update_energy_calculation(records_limit, panel_area, n_clicks, table_childre
     df_table["slrw_avg"] = df_table["slrw_avg"].round(2)
     df_table["delta_horas"] = df_table["delta_horas"].round(4)
     df_table["energia_tramo_Wh"] = df_table["energia_tramo_Wh"].round(4)
-    df_table = df_table.drop(columns=["slrw_avg_shift"])
     
     table = dash_table.DataTable(
         columns=[{"name": i, "id": i} for i in df_table.columns],
@@ -465,6 +591,37 @@ def update_energy_calculation(records_limit, panel_area, n_clicks, table_childre
     
     return fig, metrics, table, csv_data
 
+@dash_app.callback(
+    [Output('h2-graph', 'figure'), Output('h2-metrics', 'children')],
+    [Input('date-range', 'start_date'), Input('date-range', 'end_date'),
+     Input('h2-rated-power', 'value'), Input('h2-min-load', 'value'), Input('h2-panel-area', 'value')]
+)
+def update_hydrogen_production(start_date, end_date, rated_power, min_load, panel_area):
+    try:
+        result = hydrogen_production(start_date, end_date, rated_power_kw=rated_power,
+                                     min_load=float(min_load) / 100, panel_area=panel_area)
+    except (TypeError, ValueError):
+        return px.bar(), html.Div("Parámetros del electrolizador no válidos.")
+    daily = result['daily']
+    if daily.empty:
+        return px.bar(), html.Div("No hay datos para estimar la producción de hidrógeno.")
+    
+    fig = px.bar(x=daily.index, y=daily.values * 1000, title="Hidrógeno Producido por Día",
+                 labels={'x': 'Fecha', 'y': 'H₂ (g)'})
+    fig.update_traces(marker_color='#00dca0')
+    fig.update_layout(margin=dict(l=20, r=20, t=40, b=20), plot_bgcolor="#222", paper_bgcolor="#222", font_color="#fff")
+    
+    metrics = dbc.Card([
+        dbc.CardBody([
+            html.H5("Producción de Hidrógeno", className="card-title"),
+            html.P(f"Total: {result['total_kg'] * 1000:.1f} g H₂", className="card-text", style={"color": "#00dca0", "fontWeight": "bold"}),
+            html.P(f"Promedio diario: {daily.mean() * 1000:.1f} g H₂", className="card-text"),
+            html.P(f"Energía FV: {result['pv_energy_kwh']:.2f} kWh", className="card-text", style={"color": "#f39c12"}),
+            html.P(f"Horas de operación: {result['operating_hours']:.1f} h", className="card-text", style={"color": "#aaa"}),
+        ])
+    ], className="mt-3")
+    return fig, metrics
+
 @dash_app.callback(
     [Output('climate-results', 'children'), Output('climate-graph', 'figure')],
     [Input('climate-simulation', 'value')]
@@ -0,0 +1,201 @@
+# archive.py
+
+from contextlib import contextmanager
+import json
+import os
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos
+    fcntl = None
+
+# Rejilla regular de 10 minutos (igual que el datalogger)
+STEP_SECONDS = 600
+DAY_SECONDS = 86400
+
+
+def _merge_ranges(ranges):
+    """Unir rangos [inicio, fin) solapados o contiguos"""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+class ColumnarArchive:
+    """Archivo columnar de solo anexado para días cerrados de solar_data
+
+    Cada columna se guarda como un arreglo float64 de ancho fijo (`<columna>.f64`)
+    sobre una rejilla de 10 minutos, junto con una máscara de huecos (`mask.u1`) y
+    el desfase en segundos de la muestra dentro de su ranura (`offset.i2`), de modo
+    que los timestamps originales se conservan. Los archivos se leen con np.memmap,
+    por lo que los rangos son rebanadas sin copia.
+
+    Los días con más de una muestra por ranura no se archivan: quedan como hueco y
+    su rango se anota en `sql_ranges` para leerlos de la base de datos. `max_id` es
+    el último id de solar_data visto al compactar; las filas con id mayor y fecha
+    dentro del archivo son llegadas tardías que también se leen de la base de datos.
+    `meta.json` se reemplaza de forma atómica después de escribir los datos.
+    """
+
+    def __init__(self, path, columns):
+        self.path = path
+        self.columns = tuple(columns)
+        self._meta = None
+        self._meta_version = None
+        self._maps = {}
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def meta(self):
+        """Metadatos actuales (se recargan si otro proceso compactó el archivo)"""
+        try:
+            stat = os.stat(self._file("meta.json"))
+        except FileNotFoundError:
+            return None
+        # os.replace crea un inodo nuevo en cada compactación
+        version = (stat.st_ino, stat.st_mtime_ns)
+        if version != self._meta_version:
+            with open(self._file("meta.json")) as f:
+                self._meta = json.load(f)
+            self._meta_version = version
+            self._maps = {}
+        return self._meta
+
+    @property
+    def end(self):
+        """Epoch (exclusivo) hasta donde llega el archivo"""
+        meta = self.meta()
+        return meta["end"] if meta else None
+
+    def _map(self, name, dtype, slots):
+        # Las rebanadas se toman con el tamaño de la instantánea de meta que las pidió
+        key = (name, slots)
+        if key not in self._maps:
+            self._maps[key] = np.memmap(self._file(name), dtype=dtype, mode="r", shape=(slots,))
+        return self._maps[key]
+
+    def read(self, start=None, end=None, columns=None):
+        """Rebanadas sin copia para el rango epoch [start, end)
+
+        Devuelve (timestamps epoch, {columna: valores}, máscara, meta) o None si no
+        hay archivo. `meta` es la instantánea usada para las rebanadas: su `end`,
+        `max_id` y `sql_ranges` indican qué debe completarse desde la base de datos.
+        """
+        meta = self.meta()
+        if meta is None:
+            return None
+        slots = meta["slots"]
+        if slots == 0:
+            empty = np.empty(0)
+            return np.empty(0, dtype=np.int64), {c: empty for c in columns or self.columns}, empty.astype(np.bool_), meta
+        # Misma división entera (piso) que usa append para ubicar cada muestra
+        first = 0 if start is None else (start - meta["start"]) // STEP_SECONDS
+        last = slots if end is None else (end - 1 - meta["start"]) // STEP_SECONDS + 1
+        first, last = max(first, 0), min(last, slots)
+        last = max(first, last)
+        offsets = self._map("offset.i2", np.int16, slots)
+        ts = meta["start"] + np.arange(first, last, dtype=np.int64) * STEP_SECONDS + offsets[first:last]
+        # Solo las ranuras de los extremos pueden tener muestras fuera del rango
+        lo, hi = 0, len(ts)
+        if start is not None and hi and ts[0] < start:
+            lo = 1
+        if end is not None and hi > lo and ts[-1] >= end:
+            hi -= 1
+        sl = slice(first + lo, first + hi)
+        values = {c: self._map(f"{c}.f64", np.float64, slots)[sl] for c in columns or self.columns}
+        mask = self._map("mask.u1", np.bool_, slots)[sl]
+        ts = ts[lo:hi]
+        # Días con filas tardías: la base de datos tiene la versión completa
+        for range_start, range_end in meta["sql_ranges"]:
+            inside = (ts >= range_start) & (ts < range_end)
+            if inside.any():
+                mask = mask & ~inside
+        return ts, values, mask, meta
+
+    def append(self, ts, values, end, max_id, late_days=()):
+        """Anexar los días cerrados hasta `end` (epoch, inicio de día) a partir de muestras
+
+        Las muestras se ubican en su ranura de 10 minutos conservando su desfase; los
+        días sin datos quedan marcados como huecos. `late_days` son días ya archivados
+        con filas tardías, que pasan a leerse de la base de datos.
+        """
+        meta = self.meta()
+        current = meta["slots"] if meta else 0
+        if meta is None:
+            if len(ts) == 0:
+                return 0
+            meta = {"start": int(ts.min() // DAY_SECONDS * DAY_SECONDS), "step": STEP_SECONDS,
+                    "slots": 0, "end": None, "max_id": None, "sql_ranges": [],
+                    "columns": list(self.columns)}
+            first = meta["start"]
+        else:
+            first = meta["end"]
+        if len(ts) and ts.min() < first:
+            raise ValueError("Solo se pueden anexar datos posteriores al final del archivo")
+        slots = max(0, (end - first) // STEP_SECONDS)
+        if len(ts) and ts.max() >= first + slots * STEP_SECONDS:
+            raise ValueError("Las muestras exceden el último día cerrado")
+
+        index = (ts - first) // STEP_SECONDS
+        sql_ranges = [list(r) for r in meta["sql_ranges"]]
+        sql_ranges += [[d, d + DAY_SECONDS] for d in late_days]
+
+        # Ranuras con varias muestras: esos días completos se dejan en la base de datos
+        slot_ids, counts = np.unique(index, return_counts=True)
+        if (counts > 1).any():
+            day_of = lambda i: (first + i * STEP_SECONDS) // DAY_SECONDS * DAY_SECONDS
+            bad_days = np.unique(day_of(slot_ids[counts > 1]))
+            sql_ranges += [[int(d), int(d) + DAY_SECONDS] for d in bad_days]
+            keep = ~np.isin(day_of(index), bad_days)
+            ts, index = ts[keep], index[keep]
+            values = {c: np.asarray(values[c])[keep] for c in self.columns}
+
+        os.makedirs(self.path, exist_ok=True)
+        mask = np.zeros(slots, dtype=np.bool_)
+        mask[index] = True
+        offsets = np.zeros(slots, dtype=np.int16)
+        offsets[index] = ts - (first + index * STEP_SECONDS)
+        for column in self.columns:
+            grid = np.full(slots, np.nan)
+            grid[index] = values[column]
+            self._write(f"{column}.f64", current * 8, grid)
+        self._write("mask.u1", current, mask)
+        self._write("offset.i2", current * 2, offsets)
+
+        meta = {
+            **meta,
+            "slots": int(current + slots),
+            "end": int(first + slots * STEP_SECONDS),
+            "max_id": None if max_id is None else int(max_id),
+            "sql_ranges": _merge_ranges(sql_ranges),
+        }
+        tmp = self._file("meta.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp, self._file("meta.json"))
+        return int(slots)
+
+    def _write(self, name, offset, array):
+        # Descartar bytes de una compactación interrumpida antes de anexar
+        with open(self._file(name), "ab") as f:
+            f.truncate(offset)
+            f.write(array.tobytes())
+
+    @contextmanager
+    def lock(self):
+        """Bloqueo exclusivo entre procesos (workers de gunicorn) durante la compactación"""
+        os.makedirs(self.path, exist_ok=True)
+        with open(self._file(".lock"), "w") as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
@@ -0,0 +1,18 @@
+"""
+Configuración de pytest: las pruebas usan una base de datos y un archivo temporales
+"""
+
+import os
+import shutil
+import tempfile
+
+# Debe ejecutarse antes de importar db_utils, que inicializa la base de datos al importarse
+_tmp_dir = tempfile.mkdtemp(prefix="solar_tests_")
+os.environ["DATABASE_URL"] = os.path.join(_tmp_dir, "solar_data.db")
+os.environ["ARCHIVE_DIR"] = os.path.join(_tmp_dir, "solar_archive")
+os.environ["SCHEDULER_LOCK"] = os.path.join(_tmp_dir, "scheduler.lock")
+os.environ["SCHEDULER_ENABLED"] = "0"
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(_tmp_dir, ignore_errors=True)
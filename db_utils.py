@@ -1,34 +1,57 @@
 # db_utils.py
 
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 import pandas as pd
+import numpy as np
 import os
-import sqlite3
 from datetime import datetime, timedelta
 import math
+from storage import CHUNK_SIZE, get_backend
+from archive import ColumnarArchive
 
-# Usar SQLite para Render (más simple)
-DB_PATH = os.getenv("DATABASE_URL", "solar_data.db")
-engine = create_engine(f"sqlite:///{DB_PATH}")
+# Backend seleccionado por DATABASE_URL (SQLite por defecto, PostgreSQL en producción)
+backend = get_backend()
+engine = backend.engine
 
 def init_db():
-    """Inicializar la base de datos SQLite con datos de ejemplo"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    # Crear tabla si no existe
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS solar_data (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp DATETIME NOT NULL,
-            slrw_avg REAL,
-            slrw_2_avg REAL
-        )
-    ''')
+    """Inicializar la base de datos con datos de ejemplo"""
+    with engine.begin() as conn:
+        # Crear tabla si no existe
+        conn.execute(text(f'''
+            CREATE TABLE IF NOT EXISTS solar_data (
+                id {backend.pk_type},
+                timestamp {backend.timestamp_type} NOT NULL,
+                slrw_avg REAL,
+                slrw_2_avg REAL
+            )
+        '''))
+        # Índice para los filtros por fecha (rangos del dashboard y archivo columnar)
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_solar_data_timestamp ON solar_data (timestamp)"))
+        # KPIs materializados de la página de inicio (una sola fila)
+        conn.execute(text(f'''
+            CREATE TABLE IF NOT EXISTS kpi_snapshot (
+                id INTEGER PRIMARY KEY,
+                updated_at {backend.timestamp_type},
+                avg_irradiance REAL,
+                max_irradiance REAL,
+                total_energy REAL
+            )
+        '''))
+        # Últimas ejecuciones de las tareas programadas
+        conn.execute(text(f'''
+            CREATE TABLE IF NOT EXISTS scheduler_jobs (
+                name VARCHAR(64) PRIMARY KEY,
+                last_start {backend.timestamp_type},
+                duration_s REAL,
+                status VARCHAR(16),
+                error TEXT,
+                runs INTEGER
+            )
+        '''))
+        count = conn.execute(text("SELECT COUNT(*) FROM solar_data")).scalar()
     
     # Insertar datos de ejemplo si la tabla está vacía
-    cursor.execute("SELECT COUNT(*) FROM solar_data")
-    if cursor.fetchone()[0] == 0:
+    if count == 0:
         # Generar datos de ejemplo para las últimas 30 horas
         base_time = datetime.now() - timedelta(hours=30)
         sample_data = []
@@ -44,46 +67,255 @@ def init_db():
             
             sample_data.append((timestamp, irradiance, irradiance * 0.95))
         
-        cursor.executemany(
-            "INSERT INTO solar_data (timestamp, slrw_avg, slrw_2_avg) VALUES (?, ?, ?)",
-            sample_data
+        backend.bulk_load(
+            "solar_data",
+            pd.DataFrame(sample_data, columns=["timestamp", "slrw_avg", "slrw_2_avg"])
         )
-        
-        conn.commit()
         print(f"Base de datos inicializada con {len(sample_data)} registros de ejemplo")
-    
-    conn.close()
 
-# Función para obtener datos entre dos fechas y columna
-def get_solar_data(start_date=None, end_date=None, column="slrw_avg"):
+# Columnas de medición disponibles en solar_data
+SOLAR_COLUMNS = ("slrw_avg", "slrw_2_avg")
+
+# Archivo columnar de días cerrados (ARCHIVE_DIR vacío lo desactiva)
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "solar_archive")
+# Días recientes que se dejan en la base de datos por si el datalogger importa con retraso
+ARCHIVE_LAG_DAYS = int(os.getenv("ARCHIVE_LAG_DAYS", "1"))
+archive = ColumnarArchive(ARCHIVE_DIR, SOLAR_COLUMNS) if ARCHIVE_DIR else None
+
+def _validate_columns(column):
+    """Normalizar column (str o lista) y validar contra el esquema de solar_data"""
+    if isinstance(column, str):
+        columns = [column]
+    elif isinstance(column, (list, tuple)):
+        columns = list(column)
+    else:
+        raise ValueError(f"Columna no válida: {column!r}. Disponibles: {', '.join(SOLAR_COLUMNS)}")
+    invalid = [c for c in columns if c not in SOLAR_COLUMNS]
+    if not columns or invalid:
+        raise ValueError(f"Columnas no válidas: {invalid or columns}. Disponibles: {', '.join(SOLAR_COLUMNS)}")
+    return columns
+
+def _solar_query(columns, start_date=None, end_date=None, since=None, before=None,
+                 after_id=None, upto_id=None, unarchived=None):
+    """Construir la consulta de datos solares con filtros opcionales de fechas e ids
+
+    El timestamp se devuelve como segundos epoch (entero) calculados en la base de datos.
+    unarchived recibe la instantánea de meta del archivo columnar y limita el resultado
+    a las filas que el archivo no cubre: posteriores a su final, llegadas tardías
+    (id > max_id) y días dejados en la base de datos (sql_ranges).
+    """
+    epoch = backend.epoch_sql('timestamp')
+    # Timestamps que la base de datos no puede interpretar (epoch NULL) se descartan
+    conditions, params = [f"{epoch} IS NOT NULL"], {}
+    bounds = _date_bounds(start_date, end_date)
+    if bounds:
+        conditions.append("timestamp >= :start AND timestamp < :end")
+        params.update(start=_sql_datetime(bounds[0]), end=_sql_datetime(bounds[1]))
+    if since is not None:
+        conditions.append("timestamp >= :since")
+        params["since"] = since
+    if before is not None:
+        conditions.append("timestamp < :before")
+        params["before"] = before
+    if after_id is not None:
+        conditions.append("id > :after_id")
+        params["after_id"] = after_id
+    if upto_id is not None:
+        conditions.append("id <= :upto_id")
+        params["upto_id"] = upto_id
+    if unarchived is not None:
+        terms = ["timestamp >= :archive_end"]
+        params["archive_end"] = _sql_datetime(unarchived["end"])
+        if unarchived["max_id"] is not None:
+            terms.append("id > :archive_max_id")
+            params["archive_max_id"] = unarchived["max_id"]
+        for i, (range_start, range_end) in enumerate(unarchived["sql_ranges"]):
+            terms.append(f"(timestamp >= :sql_start_{i} AND timestamp < :sql_end_{i})")
+            params[f"sql_start_{i}"] = _sql_datetime(range_start)
+            params[f"sql_end_{i}"] = _sql_datetime(range_end)
+        conditions.append(f"({' OR '.join(terms)})")
+    query = text(f'''
+        SELECT {epoch} AS ts, {', '.join(columns)}
+        FROM solar_data
+        WHERE {' AND '.join(conditions)}
+        ORDER BY timestamp
+    ''')
+    return query, params or None
+
+def _read_sql(columns, **filters):
+    """Leer de la base de datos como (epoch int64, {columna: float64})"""
     try:
-        with engine.connect() as conn:
-            if start_date and end_date:
-                query = text(f'''
-                    SELECT timestamp, {column}
-                    FROM solar_data
-                    WHERE timestamp BETWEEN :start AND :end
-                    ORDER BY timestamp
-                ''')
-                df = pd.read_sql(query, conn, params={"start": start_date, "end": end_date})
-            else:
-                query = text(f'''
-                    SELECT timestamp, {column}
-                    FROM solar_data
-                    ORDER BY timestamp
-                ''')
-                df = pd.read_sql(query, conn)
-        
-        # Asegurar que la columna timestamp sea datetime
-        if not df.empty and 'timestamp' in df.columns:
-            df['timestamp'] = pd.to_datetime(df['timestamp'])
-        
-        return df
+        query, params = _solar_query(columns, **filters)
+        df = backend.read_query(query, params=params)
     except Exception as e:
         print(f"Error obteniendo datos: {e}")
-        # Retornar DataFrame vacío en caso de error
-        return pd.DataFrame(columns=['timestamp', column])
+        # Retornar resultado vacío en caso de error
+        df = pd.DataFrame({'ts': [], **{c: [] for c in columns}})
+    return df['ts'].to_numpy(dtype=np.int64), {c: df[c].to_numpy(dtype=np.float64) for c in columns}
+
+def _epoch(value):
+    return int(pd.Timestamp(value).timestamp())
+
+def _sql_datetime(epoch):
+    """Epoch a texto 'YYYY-MM-DD HH:MM:SS' comparable con la columna timestamp"""
+    return str(np.datetime64(int(epoch), 's')).replace('T', ' ')
+
+def _date_bounds(start_date, end_date):
+    """Rango epoch [inicio, fin) para start_date/end_date (fin inclusivo, al segundo)
+
+    La base de datos y el archivo columnar filtran con los mismos límites, de modo
+    que fechas sin hora ('2024-01-04') o timestamps con microsegundos dan el mismo
+    resultado en ambos caminos.
+    """
+    if not (start_date and end_date):
+        return None
+    return _epoch(start_date), _epoch(end_date) + 1
+
+def _read_archive(columns, start_date, end_date):
+    """Parte del rango cubierta por el archivo columnar (sin copia si no hay huecos)
+
+    Devuelve también la instantánea de meta usada, para completar desde la base de
+    datos exactamente lo que esa instantánea no cubre.
+    """
+    if archive is None:
+        return None
+    bounds = _date_bounds(start_date, end_date)
+    if bounds:
+        result = archive.read(*bounds, columns)
+    else:
+        result = archive.read(columns=columns)
+    if result is None:
+        return None
+    ts, values, mask, meta = result
+    if not mask.all():
+        ts, values = ts[mask], {c: v[mask] for c, v in values.items()}
+    return ts, values, meta
+
+def _convert(ts, values, epoch, float32, as_arrays):
+    """Convertir (epoch, valores) al formato pedido"""
+    if not epoch:
+        ts = ts.view('datetime64[s]')
+    if float32:
+        values = {c: v.astype(np.float32) for c, v in values.items()}
+    if as_arrays:
+        return {'timestamp': ts, **values}
+    return pd.DataFrame({'timestamp': ts, **values})
+
+# Función para obtener datos entre dos fechas y columna(s)
+def get_solar_data(start_date=None, end_date=None, column="slrw_avg", epoch=False, float32=False, as_arrays=False):
+    """Leer solar_data en un DataFrame compacto
+
+    column acepta un nombre o una lista de columnas (validadas contra SOLAR_COLUMNS).
+    epoch=True devuelve el timestamp como segundos epoch int64 en lugar de datetime64,
+    float32=True reduce los valores a float32 y as_arrays=True devuelve un dict de
+    arreglos NumPy en lugar de un DataFrame.
+
+    Los días cerrados se leen del archivo columnar (ARCHIVE_DIR); en la base de
+    datos solo se consulta lo que el archivo no cubre (ver _solar_query).
+    """
+    columns = _validate_columns(column)
+    archived = _read_archive(columns, start_date, end_date)
+    if archived is None:
+        ts, values = _read_sql(columns, start_date=start_date, end_date=end_date)
+        return _convert(ts, values, epoch, float32, as_arrays)
+
+    ts, values, meta = archived
+    sql_ts, sql_values = _read_sql(columns, start_date=start_date, end_date=end_date, unarchived=meta)
+    if len(sql_ts):
+        ts = np.concatenate([ts, sql_ts])
+        values = {c: np.concatenate([values[c], sql_values[c]]) for c in columns}
+        # Filas tardías o días no archivados caen dentro del rango del archivo
+        if sql_ts[0] < meta["end"]:
+            order = np.argsort(ts, kind="stable")
+            ts, values = ts[order], {c: v[order] for c, v in values.items()}
+    return _convert(ts, values, epoch, float32, as_arrays)
+
+def iter_solar_data(start_date=None, end_date=None, column="slrw_avg", chunksize=CHUNK_SIZE,
+                    epoch=False, float32=False, as_arrays=False):
+    """Igual que get_solar_data pero leyendo la base de datos en bloques con un cursor del servidor"""
+    columns = _validate_columns(column)
+    query, params = _solar_query(columns, start_date=start_date, end_date=end_date)
+    for chunk in backend.iter_query(query, params=params, chunksize=chunksize):
+        values = {c: chunk[c].to_numpy(dtype=np.float64) for c in columns}
+        yield _convert(chunk['ts'].to_numpy(dtype=np.int64), values, epoch, float32, as_arrays)
+
+def compact_archive(now=None):
+    """Compactar en el archivo columnar los días cerrados que aún no están archivados
+
+    Un día se considera cerrado cuando tiene más de ARCHIVE_LAG_DAYS días de antigüedad.
+    """
+    if archive is None:
+        return 0
+    closed = _epoch(pd.Timestamp(now or datetime.now()).normalize()) - ARCHIVE_LAG_DAYS * 86400
+    with archive.lock():
+        meta = archive.meta()
+        # Las filas insertadas después de este id se tratarán como tardías
+        max_id = get_data_watermark()
+        if max_id is None:
+            return 0
+        late_days = []
+        if meta is not None and meta["max_id"] is not None:
+            late_ts, _ = _read_sql(SOLAR_COLUMNS, after_id=meta["max_id"], upto_id=max_id,
+                                   before=_sql_datetime(meta["end"]))
+            late_days = np.unique(late_ts // 86400 * 86400).tolist()
+        since = meta["end"] if meta is not None else None
+        ts, values = _read_sql(SOLAR_COLUMNS, since=_sql_datetime(since) if since is not None else None,
+                               before=_sql_datetime(closed), upto_id=max_id)
+        return archive.append(ts, values, end=closed, max_id=max_id, late_days=late_days)
+
+def get_data_watermark():
+    """Marca de agua de solar_data (último id insertado) para invalidar cachés derivadas"""
+    try:
+        with engine.connect() as conn:
+            return conn.execute(text("SELECT MAX(id) FROM solar_data")).scalar()
+    except Exception as e:
+        print(f"Error obteniendo marca de agua: {e}")
+        return None
+
+def refresh_kpis(panel_area=2):
+    """Recalcular la fila de kpi_snapshot con las últimas 24 horas de registros"""
+    with engine.begin() as conn:
+        last = conn.execute(text("SELECT MAX(timestamp) FROM solar_data")).scalar()
+        if last is None:
+            avg_irradiance = max_irradiance = total_energy = 0
+        else:
+            since = _sql_datetime(_epoch(last) - 86400)
+            avg_irradiance, max_irradiance, total = conn.execute(text('''
+                SELECT AVG(slrw_avg), MAX(slrw_avg), SUM(slrw_avg)
+                FROM solar_data
+                WHERE timestamp > :since
+            '''), {"since": since}).one()
+            # kWh para el panel con registros de 10 minutos
+            total_energy = (total or 0) * panel_area * (10/60) / 1000
+        kpis = {
+            "updated_at": datetime.now().isoformat(sep=" ", timespec="seconds"),
+            "avg_irradiance": avg_irradiance or 0,
+            "max_irradiance": max_irradiance or 0,
+            "total_energy": total_energy,
+        }
+        conn.execute(text('''
+            INSERT INTO kpi_snapshot (id, updated_at, avg_irradiance, max_irradiance, total_energy)
+            VALUES (1, :updated_at, :avg_irradiance, :max_irradiance, :total_energy)
+            ON CONFLICT (id) DO UPDATE SET
+                updated_at = excluded.updated_at,
+                avg_irradiance = excluded.avg_irradiance,
+                max_irradiance = excluded.max_irradiance,
+                total_energy = excluded.total_energy
+        '''), kpis)
+    return kpis
+
+def get_kpis():
+    """Leer los KPIs materializados (None si aún no se han calculado)"""
+    with engine.connect() as conn:
+        row = conn.execute(text('''
+            SELECT updated_at, avg_irradiance, max_irradiance, total_energy
+            FROM kpi_snapshot WHERE id = 1
+        ''')).mappings().first()
+    return dict(row) if row else None
 
 # Inicializar la base de datos al importar el módulo
 init_db()
 
+if __name__ == '__main__':
+    # Compactación manual: python db_utils.py
+    print(f"Ranuras agregadas al archivo columnar: {compact_archive()}")
@@ -0,0 +1,105 @@
+# hydrogen.py
+
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from db_utils import get_solar_data, get_data_watermark
+
+# Intervalo de registro del datalogger (igual que calculos_irradiacion.py)
+MINUTOS_INTERVALO = 10
+HORAS_INTERVALO = MINUTOS_INTERVALO / 60
+
+# Poder calorífico inferior del hidrógeno (kWh/kg)
+H2_LHV_KWH_KG = 33.33
+
+# Curva de eficiencia a carga parcial del electrolizador (fracción de carga -> eficiencia LHV)
+LOAD_POINTS = (0.1, 0.25, 0.5, 0.75, 1.0)
+EFFICIENCY_POINTS = (0.52, 0.63, 0.66, 0.64, 0.61)
+
+DEFAULT_PARAMS = {
+    'panel_area': 2,             # m²
+    'panel_efficiency': 0.15,    # 15%
+    'temperature': 25,           # °C
+    'temp_coefficient': -0.004,  # -0.4% por °C
+    'rated_power_kw': 0.25,      # Potencia nominal del electrolizador
+    'min_load': 0.1,             # Fracción mínima de carga para operar
+}
+
+
+def pv_power_kw(irradiance, panel_area, panel_efficiency, temperature=25, temp_coefficient=-0.004):
+    """Potencia fotovoltaica (kW), mismo modelo que /api/solar-efficiency"""
+    temp_correction = 1 + temp_coefficient * (np.asarray(temperature, dtype=float) - 25)
+    return np.asarray(irradiance, dtype=float) * panel_area * panel_efficiency * temp_correction / 1000
+
+
+def electrolyzer_h2_kg(power_kw, rated_power_kw, min_load, hours=HORAS_INTERVALO,
+                       load_points=LOAD_POINTS, efficiency_points=EFFICIENCY_POINTS):
+    """Hidrógeno producido (kg) por intervalo para una serie de potencias disponibles"""
+    if not rated_power_kw > 0:
+        raise ValueError("La potencia nominal del electrolizador debe ser mayor que cero")
+    power_kw = np.nan_to_num(np.asarray(power_kw, dtype=float), nan=0.0)
+    # Recortar a la potencia nominal y apagar por debajo de la carga mínima
+    used_kw = np.minimum(np.maximum(power_kw, 0), rated_power_kw)
+    load = used_kw / rated_power_kw
+    used_kw = np.where(load >= min_load, used_kw, 0.0)
+    efficiency = np.interp(load, load_points, efficiency_points)
+    return used_kw * hours * efficiency / H2_LHV_KWH_KG
+
+
+def validate_params(params):
+    """Combinar con DEFAULT_PARAMS y validar rangos; ValueError si algún valor no es válido"""
+    p = {key: float(value) for key, value in {**DEFAULT_PARAMS, **params}.items()}
+    if not p['rated_power_kw'] > 0:
+        raise ValueError("rated_power_kw debe ser mayor que cero")
+    if not 0 <= p['min_load'] <= 1:
+        raise ValueError("min_load debe estar entre 0 y 1")
+    if not p['panel_area'] > 0:
+        raise ValueError("panel_area debe ser mayor que cero")
+    return p
+
+
+def estimate_hydrogen(df, column="slrw_avg", **params):
+    """Estimar producción de H₂ por intervalo, día y mes a partir de un DataFrame de irradiancia"""
+    p = validate_params(params)
+    if df.empty:
+        empty = pd.DataFrame(columns=['timestamp', 'pv_kw', 'h2_kg'])
+        return {'intervals': empty, 'daily': pd.Series(dtype=float), 'monthly': pd.Series(dtype=float),
+                'total_kg': 0.0, 'pv_energy_kwh': 0.0, 'operating_hours': 0.0}
+
+    pv_kw = pv_power_kw(df[column].to_numpy(), p['panel_area'], p['panel_efficiency'],
+                        p['temperature'], p['temp_coefficient'])
+    h2_kg = electrolyzer_h2_kg(pv_kw, p['rated_power_kw'], p['min_load'])
+
+    intervals = pd.DataFrame({'timestamp': df['timestamp'].to_numpy(), 'pv_kw': pv_kw, 'h2_kg': h2_kg})
+    by_time = intervals.set_index('timestamp')['h2_kg']
+    daily = by_time.resample('D').sum()
+    monthly = by_time.resample('MS').sum()
+
+    return {
+        'intervals': intervals,
+        'daily': daily,
+        'monthly': monthly,
+        'total_kg': float(h2_kg.sum()),
+        'pv_energy_kwh': float(np.nansum(pv_kw) * HORAS_INTERVALO),
+        'operating_hours': float(np.count_nonzero(h2_kg > 0) * HORAS_INTERVALO),
+    }
+
+
+@lru_cache(maxsize=32)
+def _cached_estimate(watermark, start_date, end_date, params):
+    # La marca de agua forma parte de la clave: datos nuevos invalidan la entrada.
+    # Solo se guardan los agregados; la serie por intervalo ocupa tanto como el histórico
+    df = get_solar_data(start_date, end_date, column="slrw_avg")
+    result = estimate_hydrogen(df, **dict(params))
+    del result['intervals']
+    return result
+
+
+def hydrogen_production(start_date=None, end_date=None, **params):
+    """Producción de H₂ (agregados diarios, mensuales y totales) sobre el histórico almacenado
+
+    El resultado se guarda en caché por marca de agua de los datos; para la serie por
+    intervalo usar estimate_hydrogen directamente.
+    """
+    p = validate_params(params)
+    return _cached_estimate(get_data_watermark(), start_date, end_date, tuple(sorted(p.items())))
@@ -0,0 +1,172 @@
+# scheduler.py
+
+from datetime import datetime, timedelta
+import os
+import threading
+import time
+from sqlalchemy import text
+from db_utils import engine, compact_archive, refresh_kpis
+from calculos_irradiacion import run_etl
+
+try:
+    import fcntl
+except ImportError:  # Windows: cada proceso se considera líder
+    fcntl = None
+
+# Archivo de bloqueo para elegir un único líder entre los workers de gunicorn
+LOCK_PATH = os.getenv("SCHEDULER_LOCK", "scheduler.lock")
+TICK_SECONDS = 30
+
+# Cadencias configurables (segundos)
+ETL_INTERVAL = int(os.getenv("ETL_INTERVAL_SECONDS", "86400"))
+KPI_INTERVAL = int(os.getenv("KPI_INTERVAL_SECONDS", "600"))
+ARCHIVE_INTERVAL = int(os.getenv("ARCHIVE_INTERVAL_SECONDS", "86400"))
+DAY_SECONDS = 86400
+
+
+def next_run_after(started, interval):
+    """Epoch de la siguiente ejecución; las cadencias en días se alinean a medianoche (hora local)"""
+    if interval % DAY_SECONDS == 0:
+        midnight = datetime.fromtimestamp(started).replace(hour=0, minute=0, second=0, microsecond=0)
+        return (midnight + timedelta(seconds=interval)).timestamp()
+    return started + interval
+
+
+class Scheduler:
+    """Planificador en proceso; solo el worker que obtiene el bloqueo ejecuta las tareas"""
+
+    def __init__(self, lock_path=LOCK_PATH, tick=TICK_SECONDS):
+        self.lock_path = lock_path
+        self.tick = tick
+        self.jobs = {}
+        self._lock_file = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add_job(self, name, func, interval):
+        # next_run se calcula desde scheduler_jobs al tomar el liderazgo
+        self.jobs[name] = {"func": func, "interval": interval, "next_run": 0}
+
+    @property
+    def is_leader(self):
+        return self._lock_file is not None
+
+    def acquire_leadership(self):
+        """Intentar tomar el bloqueo sin esperar; se libera al terminar el proceso"""
+        if self.is_leader:
+            return True
+        f = open(self.lock_path, "a")
+        if fcntl:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                f.close()
+                return False
+        self._lock_file = f
+        return True
+
+    def release_leadership(self):
+        if self._lock_file is not None:
+            if fcntl:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+            self._lock_file.close()
+            self._lock_file = None
+
+    def run_pending(self, now=None):
+        """Ejecutar las tareas vencidas (solo si este proceso es el líder)"""
+        was_leader = self.is_leader
+        if not self.acquire_leadership():
+            return []
+        if not was_leader:
+            self._load_next_runs()
+        now = time.time() if now is None else now
+        ran = []
+        for name, job in self.jobs.items():
+            if job["next_run"] <= now:
+                self._run_job(name, job["func"], now)
+                job["next_run"] = next_run_after(now, job["interval"])
+                ran.append(name)
+        return ran
+
+    def _load_next_runs(self):
+        """Retomar la agenda desde la última ejecución registrada (sobrevive a reinicios)"""
+        try:
+            last_start = {job["name"]: job["last_start"] for job in get_job_runs()}
+        except Exception as e:
+            print(f"Error leyendo scheduler_jobs: {e}")
+            last_start = {}
+        for name, job in self.jobs.items():
+            started = last_start.get(name)
+            # Sin registro previo: la tarea se ejecuta en cuanto se toma el liderazgo
+            job["next_run"] = 0 if started is None else next_run_after(
+                datetime.fromisoformat(str(started)).timestamp(), job["interval"])
+
+    def _run_job(self, name, func, now):
+        started = datetime.fromtimestamp(now).replace(microsecond=0)
+        t0 = time.perf_counter()
+        status, error = "ok", None
+        try:
+            func()
+        except Exception as e:
+            status, error = "error", str(e)
+            print(f"Error en tarea programada {name}: {e}")
+        record_job_run(name, started, time.perf_counter() - t0, status, error)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self.run_pending()
+            self._stop.wait(self.tick)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="scheduler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.release_leadership()
+
+
+def record_job_run(name, started, duration, status, error=None):
+    """Registrar la última ejecución de una tarea en scheduler_jobs"""
+    try:
+        with engine.begin() as conn:
+            conn.execute(text('''
+                INSERT INTO scheduler_jobs (name, last_start, duration_s, status, error, runs)
+                VALUES (:name, :last_start, :duration_s, :status, :error, 1)
+                ON CONFLICT (name) DO UPDATE SET
+                    last_start = excluded.last_start,
+                    duration_s = excluded.duration_s,
+                    status = excluded.status,
+                    error = excluded.error,
+                    runs = scheduler_jobs.runs + 1
+            '''), {
+                "name": name,
+                "last_start": started.isoformat(sep=" ", timespec="seconds"),
+                "duration_s": round(duration, 4),
+                "status": status,
+                "error": error,
+            })
+    except Exception as e:
+        print(f"Error registrando tarea {name}: {e}")
+
+
+def get_job_runs():
+    """Últimas ejecuciones de todas las tareas, para monitoreo"""
+    with engine.connect() as conn:
+        rows = conn.execute(text('''
+            SELECT name, last_start, duration_s, status, error, runs
+            FROM scheduler_jobs ORDER BY name
+        ''')).mappings().all()
+    return [dict(row) for row in rows]
+
+
+def create_scheduler():
+    scheduler = Scheduler()
+    scheduler.add_job("kpis", refresh_kpis, KPI_INTERVAL)
+    scheduler.add_job("etl_irradiancia", run_etl, ETL_INTERVAL)
+    scheduler.add_job("archive", compact_archive, ARCHIVE_INTERVAL)
+    return scheduler
@@ -0,0 +1,181 @@
+# sizing.py
+
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+import math
+import os
+import numpy as np
+from db_utils import get_solar_data, get_data_watermark
+from hydrogen import HORAS_INTERVALO
+
+# Latitud del sitio (mismo supuesto ~30° que el ángulo óptimo de /api/solar-efficiency)
+LATITUDE = float(os.getenv("SITE_LATITUDE", "30"))
+
+# Temperatura nominal de operación de la celda (°C) para estimar la temperatura del panel
+NOCT = 45
+
+# Celdas (inclinaciones × muestras) por bloque para acotar la memoria
+CHUNK_CELLS = int(os.getenv("SIZING_CHUNK_CELLS", "2000000"))
+# A partir de este número de celdas se reparte el trabajo en un pool de procesos
+PARALLEL_CELLS = int(os.getenv("SIZING_PARALLEL_CELLS", "50000000"))
+MAX_CONFIGS = 1_000_000
+
+DEFAULT_COSTS = {
+    'cost_per_wp': 0.35,   # USD por Wp de módulo
+    'cost_per_m2': 60.0,   # USD por m² de estructura e instalación
+}
+
+
+def _geometry(timestamps):
+    """Día del año y hora decimal de cada muestra"""
+    ts = timestamps.astype('datetime64[m]')
+    days = ts.astype('datetime64[D]')
+    doy = (days - days.astype('datetime64[Y]')).astype(np.int64) + 1
+    hour = (ts - days).astype(np.int64) / 60
+    return doy.astype(np.float64), hour
+
+
+def tilt_factor(tilts, doy, hour, latitude=LATITUDE):
+    """Relación irradiancia en plano inclinado / horizontal (panel orientado al ecuador)
+
+    En el hemisferio sur (latitud negativa) el panel mira al norte. Devuelve una matriz (inclinaciones × muestras). Con el sol bajo el horizonte
+    o muy bajo se conserva la irradiancia horizontal (predominio difuso).
+    """
+    lat = math.radians(latitude)
+    beta = np.radians(np.asarray(tilts, dtype=float))[:, None]
+    decl = np.radians(23.45) * np.sin(2 * np.pi * (284 + doy) / 365)[None, :]
+    omega = np.radians(15 * (hour - 12))[None, :]
+    cos_z = np.sin(decl) * math.sin(lat) + np.cos(decl) * math.cos(lat) * np.cos(omega)
+    # Latitud efectiva del plano inclinado hacia el ecuador
+    lat_tilted = lat - math.copysign(1, latitude) * beta
+    cos_i = np.sin(decl) * np.sin(lat_tilted) + np.cos(decl) * np.cos(lat_tilted) * np.cos(omega)
+    ratio = np.clip(cos_i, 0, None) / np.where(cos_z > 0.087, cos_z, 1)
+    return np.where(cos_z > 0.087, np.minimum(ratio, 4), 1.0)
+
+
+def _tilt_sums(irradiance, doy, hour, tilts):
+    """Suma de G y de G² en el plano del panel para cada inclinación, por bloques de tiempo"""
+    tilts = np.asarray(tilts, dtype=float)
+    g_sum = np.zeros(len(tilts))
+    g2_sum = np.zeros(len(tilts))
+    step = max(1, CHUNK_CELLS // len(tilts))
+    for start in range(0, len(irradiance), step):
+        sl = slice(start, start + step)
+        poa = irradiance[sl][None, :] * tilt_factor(tilts, doy[sl], hour[sl])
+        g_sum += poa.sum(axis=1)
+        g2_sum += np.einsum('ij,ij->i', poa, poa)
+    return g_sum, g2_sum
+
+
+@lru_cache(maxsize=4)
+def _load_history(watermark, start_date, end_date):
+    data = get_solar_data(start_date, end_date, column="slrw_avg", as_arrays=True)
+    valid = ~np.isnan(data['slrw_avg'])
+    doy, hour = _geometry(data['timestamp'][valid])
+    return data['slrw_avg'][valid], doy, hour
+
+
+def evaluate_grid(irradiance, doy, hour, panel_areas, panel_efficiencies, temp_coefficients, tilts,
+                  ambient_temperature=25, workers=None):
+    """Energía (kWh) sobre el histórico para cada combinación área × eficiencia × coef. × inclinación
+
+    Devuelve un arreglo con forma (áreas, eficiencias, coeficientes, inclinaciones).
+    """
+    tilts = np.asarray(tilts, dtype=float)
+    if len(tilts) * len(irradiance) >= PARALLEL_CELLS and len(tilts) > 1:
+        blocks = np.array_split(tilts, min(len(tilts), workers or os.cpu_count() or 1))
+        with ProcessPoolExecutor(max_workers=len(blocks)) as pool:
+            n = len(blocks)
+            parts = list(pool.map(_tilt_sums, [irradiance] * n, [doy] * n, [hour] * n, blocks))
+        g_sum = np.concatenate([p[0] for p in parts])
+        g2_sum = np.concatenate([p[1] for p in parts])
+    else:
+        g_sum, g2_sum = _tilt_sums(irradiance, doy, hour, tilts)
+
+    # Temperatura de celda: T = T_amb + (NOCT - 20) / 800 * G, por lo que
+    # Σ G·(T - 25) = (T_amb - 25)·ΣG + k·ΣG², y el coeficiente se aplica por difusión
+    k = (NOCT - 20) / 800
+    thermal = (ambient_temperature - 25) * g_sum + k * g2_sum
+    areas = np.asarray(panel_areas, dtype=float)[:, None, None, None]
+    effs = np.asarray(panel_efficiencies, dtype=float)[None, :, None, None]
+    coefs = np.asarray(temp_coefficients, dtype=float)[None, None, :, None]
+    return areas * effs * (g_sum + coefs * thermal) * HORAS_INTERVALO / 1000
+
+
+def system_cost(panel_areas, panel_efficiencies, cost_per_wp, cost_per_m2):
+    """Costo (USD) por área × eficiencia con forma (áreas, eficiencias, 1, 1)"""
+    areas = np.asarray(panel_areas, dtype=float)[:, None, None, None]
+    effs = np.asarray(panel_efficiencies, dtype=float)[None, :, None, None]
+    return areas * (cost_per_m2 + effs * 1000 * cost_per_wp)
+
+
+def pareto_front(energy, cost):
+    """Índices de las configuraciones no dominadas (máxima energía, mínimo costo)"""
+    order = np.lexsort((-energy, cost))
+    best = np.maximum.accumulate(energy[order])
+    keep = np.empty(len(order), dtype=bool)
+    keep[0] = True
+    keep[1:] = energy[order][1:] > best[:-1]
+    return order[keep]
+
+
+def validate_grid(panel_areas, panel_efficiencies, temp_coefficients, tilts):
+    """Convertir la cuadrícula a listas de float y validar rangos; ValueError si algún valor no es válido"""
+    grid = {
+        'panel_areas': [float(v) for v in panel_areas],
+        'panel_efficiencies': [float(v) for v in panel_efficiencies],
+        'temp_coefficients': [float(v) for v in temp_coefficients],
+        'tilts': [float(v) for v in tilts],
+    }
+    for name, values in grid.items():
+        if not all(math.isfinite(v) for v in values):
+            raise ValueError(f"{name} solo admite valores finitos")
+    if not all(v > 0 for v in grid['panel_areas']):
+        raise ValueError("panel_areas debe ser mayor que cero")
+    if not all(0 < v <= 1 for v in grid['panel_efficiencies']):
+        raise ValueError("panel_efficiencies debe estar en (0, 1]")
+    if not all(0 <= v <= 90 for v in grid['tilts']):
+        raise ValueError("tilts debe estar entre 0 y 90 grados")
+    return grid
+
+
+def optimize_sizing(panel_areas, panel_efficiencies, temp_coefficients, tilts,
+                    start_date=None, end_date=None, ambient_temperature=25, **costs):
+    """Barrido de parámetros sobre el histórico almacenado y su frente de Pareto energía/costo"""
+    grid = validate_grid(panel_areas, panel_efficiencies, temp_coefficients, tilts)
+    panel_areas, panel_efficiencies = grid['panel_areas'], grid['panel_efficiencies']
+    temp_coefficients, tilts = grid['temp_coefficients'], grid['tilts']
+    c = {key: float(value) for key, value in {**DEFAULT_COSTS, **costs}.items()}
+    if not all(math.isfinite(v) and v >= 0 for v in c.values()):
+        raise ValueError("Los costos deben ser finitos y no negativos")
+    if not math.isfinite(ambient_temperature):
+        raise ValueError("temperature debe ser un valor finito")
+    n_configs = len(panel_areas) * len(panel_efficiencies) * len(temp_coefficients) * len(tilts)
+    if n_configs == 0:
+        raise ValueError("La cuadrícula de parámetros está vacía")
+    if n_configs > MAX_CONFIGS:
+        raise ValueError(f"La cuadrícula excede el máximo de {MAX_CONFIGS} configuraciones")
+
+    irradiance, doy, hour = _load_history(get_data_watermark(), start_date, end_date)
+    energy = evaluate_grid(irradiance, doy, hour, panel_areas, panel_efficiencies,
+                           temp_coefficients, tilts, ambient_temperature)
+    cost = np.broadcast_to(system_cost(panel_areas, panel_efficiencies, c['cost_per_wp'], c['cost_per_m2']),
+                           energy.shape)
+
+    front = pareto_front(energy.ravel(), cost.ravel())
+    idx = np.unravel_index(front, energy.shape)
+    return {
+        'evaluated': n_configs,
+        'samples': len(irradiance),
+        'pareto': [
+            {
+                'panel_area': float(panel_areas[a]),
+                'panel_efficiency': float(panel_efficiencies[e]),
+                'temp_coefficient': float(temp_coefficients[t]),
+                'tilt': float(tilts[b]),
+                'energy_kwh': float(energy[a, e, t, b]),
+                'cost': float(cost[a, e, t, b]),
+            }
+            for a, e, t, b in zip(*idx)
+        ],
+    }
@@ -0,0 +1,176 @@
+# storage.py
+
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.engine import make_url
+import pandas as pd
+import csv
+from datetime import date, datetime
+import io
+import os
+
+# Tamaño de bloque por defecto para lecturas en streaming y cargas masivas
+CHUNK_SIZE = int(os.getenv("DB_CHUNK_SIZE", "10000"))
+
+
+class StorageBackend:
+    """Interfaz común de almacenamiento (SQLite o PostgreSQL)"""
+
+    # Tipos específicos de cada motor para las sentencias DDL
+    pk_type = "INTEGER PRIMARY KEY"
+    timestamp_type = "TIMESTAMP"
+
+    def __init__(self, url):
+        self.url = make_url(url)
+        self.engine = create_engine(self.url, **self.engine_options())
+
+    def engine_options(self):
+        """Opciones del pool de conexiones compartido por app y ETL"""
+        return {
+            "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+            "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+            "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+            "pool_pre_ping": True,
+        }
+
+    def epoch_sql(self, column):
+        """Expresión SQL que convierte una columna de fecha a segundos epoch (entero)"""
+        raise NotImplementedError
+
+    def table_exists(self, table):
+        return inspect(self.engine).has_table(table)
+
+    def iter_query(self, query, params=None, chunksize=CHUNK_SIZE):
+        """Iterar el resultado de una consulta en bloques de DataFrame usando un cursor del servidor"""
+        if isinstance(query, str):
+            query = text(query)
+        with self.engine.connect() as conn:
+            conn = conn.execution_options(stream_results=True, max_row_buffer=chunksize)
+            for chunk in pd.read_sql(query, conn, params=params, chunksize=chunksize):
+                yield chunk
+
+    def read_query(self, query, params=None):
+        """Leer el resultado completo de una consulta en un DataFrame"""
+        if isinstance(query, str):
+            query = text(query)
+        with self.engine.connect() as conn:
+            return pd.read_sql(query, conn, params=params)
+
+    def bulk_load(self, table, df, chunksize=CHUNK_SIZE):
+        """Insertar un DataFrame completo en una tabla existente"""
+        raise NotImplementedError
+
+
+class SQLiteBackend(StorageBackend):
+    pk_type = "INTEGER PRIMARY KEY AUTOINCREMENT"
+    timestamp_type = "DATETIME"
+
+    def engine_options(self):
+        # Las bases en memoria usan un pool de una sola conexión
+        if self.url.database in (None, "", ":memory:"):
+            return {}
+        return super().engine_options()
+
+    def epoch_sql(self, column):
+        return f"CAST(strftime('%s', {column}) AS INTEGER)"
+
+    def bulk_load(self, table, df, chunksize=CHUNK_SIZE):
+        """Carga masiva con executemany en transacciones por lotes"""
+        if df.empty:
+            return 0
+        columns = list(df.columns)
+        query = text(
+            f"INSERT INTO {table} ({', '.join(columns)}) "
+            f"VALUES ({', '.join(':' + c for c in columns)})"
+        )
+        rows = _to_records(df)
+        for row in rows:
+            for key, value in row.items():
+                # Mismo formato de texto que usa sqlite3 para DATETIME
+                if isinstance(value, datetime):
+                    row[key] = value.isoformat(sep=" ")
+                elif isinstance(value, date):
+                    row[key] = value.isoformat()
+        for start in range(0, len(rows), chunksize):
+            with self.engine.begin() as conn:
+                conn.execute(query, rows[start:start + chunksize])
+        return len(rows)
+
+
+class PostgresBackend(StorageBackend):
+    pk_type = "SERIAL PRIMARY KEY"
+    timestamp_type = "TIMESTAMP"
+
+    def epoch_sql(self, column):
+        return f"CAST(FLOOR(EXTRACT(EPOCH FROM {column})) AS BIGINT)"
+
+    def bulk_load(self, table, df, chunksize=CHUNK_SIZE):
+        """Carga masiva con COPY ... FROM STDIN"""
+        if df.empty:
+            return 0
+        columns = ", ".join(df.columns)
+        raw = self.engine.raw_connection()
+        try:
+            cursor = raw.cursor()
+            for start in range(0, len(df), chunksize):
+                buffer = io.StringIO()
+                df.iloc[start:start + chunksize].to_csv(
+                    buffer, index=False, header=False, quoting=csv.QUOTE_MINIMAL
+                )
+                buffer.seek(0)
+                cursor.copy_expert(f"COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+            raw.commit()
+        except Exception:
+            raw.rollback()
+            raise
+        finally:
+            raw.close()
+        return len(df)
+
+
+def _to_records(df):
+    """Convertir un DataFrame a lista de dicts con tipos nativos de Python"""
+    df = df.astype(object).where(df.notna(), None)
+    records = df.to_dict("records")
+    for row in records:
+        for key, value in row.items():
+            if isinstance(value, pd.Timestamp):
+                row[key] = value.to_pydatetime()
+    return records
+
+
+def resolve_url(value):
+    """Normalizar DATABASE_URL; una ruta simple se interpreta como archivo SQLite"""
+    if "://" not in value:
+        return f"sqlite:///{value}"
+    # Render/Heroku entregan el esquema abreviado postgres://; sin driver explícito se
+    # fija psycopg2 (SQLAlchemy 2.1 usa psycopg 3 por defecto)
+    for scheme in ("postgres://", "postgresql://"):
+        if value.startswith(scheme):
+            return "postgresql+psycopg2://" + value[len(scheme):]
+    return value
+
+
+def create_backend(url):
+    url = resolve_url(url)
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend == "sqlite":
+        return SQLiteBackend(url)
+    if backend == "postgresql":
+        # bulk_load usa copy_expert, que solo existe en psycopg2
+        if parsed.get_driver_name() != "psycopg2":
+            raise ValueError(f"Driver de PostgreSQL no soportado: {parsed.get_driver_name()} "
+                             "(usar postgresql:// o postgresql+psycopg2://)")
+        return PostgresBackend(url)
+    raise ValueError(f"Motor de base de datos no soportado: {backend}")
+
+
+_backend = None
+
+
+def get_backend():
+    """Backend compartido del proceso, seleccionado por DATABASE_URL"""
+    global _backend
+    if _backend is None:
+        _backend = create_backend(os.getenv("DATABASE_URL", "solar_data.db"))
+    return _backend
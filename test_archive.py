@@ -0,0 +1,182 @@
+"""
+Pruebas del archivo columnar memory-mapped y su combinación con la base de datos
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import text
+
+import db_utils
+from archive import STEP_SECONDS, ColumnarArchive
+
+DAY = 86400
+T0 = 1704067200  # 2024-01-01 00:00:00
+
+
+def _samples(first_day, days, offset=0, step=STEP_SECONDS):
+    ts = T0 + first_day * DAY + np.arange(0, days * DAY, step, dtype=np.int64) + offset
+    return ts, {"slrw_avg": np.arange(len(ts), dtype=float), "slrw_2_avg": np.ones(len(ts))}
+
+
+def test_append_and_read_slices(tmp_path):
+    archive = ColumnarArchive(str(tmp_path), ("slrw_avg", "slrw_2_avg"))
+    assert archive.read() is None
+
+    ts, values = _samples(0, 2, offset=90)
+    assert archive.append(ts, values, end=T0 + 2 * DAY, max_id=10) == 2 * DAY // STEP_SECONDS
+    # Día 2 sin datos: queda como hueco en la máscara
+    ts2, values2 = _samples(3, 1)
+    archive.append(ts2, values2, end=T0 + 4 * DAY, max_id=20)
+
+    reopened = ColumnarArchive(str(tmp_path), ("slrw_avg", "slrw_2_avg"))
+    assert reopened.end == T0 + 4 * DAY
+    out_ts, out, mask, meta = reopened.read(T0 + DAY, T0 + 2 * DAY, ["slrw_avg"])
+    assert meta["end"] == T0 + 4 * DAY and meta["max_id"] == 20 and meta["sql_ranges"] == []
+    assert isinstance(out["slrw_avg"], np.memmap)
+    # Los timestamps originales (desfase de 90 s) se conservan
+    assert np.array_equal(out_ts, ts[DAY // STEP_SECONDS:])
+    assert np.array_equal(out["slrw_avg"], values["slrw_avg"][DAY // STEP_SECONDS:])
+    assert mask.all()
+    assert not reopened.read(T0 + 2 * DAY, T0 + 3 * DAY)[2].any()
+
+    with pytest.raises(ValueError):
+        reopened.append(*_samples(1, 1), end=T0 + 5 * DAY, max_id=30)
+    with pytest.raises(ValueError):
+        reopened.append(*_samples(4, 2), end=T0 + 5 * DAY, max_id=30)
+
+
+def test_read_range_matches_sample_timestamps(tmp_path):
+    archive = ColumnarArchive(str(tmp_path), ("slrw_avg",))
+    ts, values = _samples(0, 1, offset=300)
+    archive.append(ts, values, end=T0 + DAY, max_id=1)
+    # Los extremos caen a mitad de ranura: solo se devuelven muestras dentro de [start, end)
+    start, end = T0 + 3600 + 100, T0 + 7200 + 400
+    out_ts, out, _, _ = archive.read(start, end)
+    inside = (ts >= start) & (ts < end)
+    assert np.array_equal(out_ts, ts[inside])
+    assert np.array_equal(out["slrw_avg"], values["slrw_avg"][inside])
+
+
+def test_sub_interval_days_stay_in_database(tmp_path):
+    archive = ColumnarArchive(str(tmp_path), ("slrw_avg", "slrw_2_avg"))
+    # Día 0 cada 5 minutos (dos muestras por ranura), día 1 en la rejilla normal
+    ts0, values0 = _samples(0, 1, step=300)
+    ts1, values1 = _samples(1, 1)
+    ts = np.concatenate([ts0, ts1])
+    values = {c: np.concatenate([values0[c], values1[c]]) for c in values0}
+    archive.append(ts, values, end=T0 + 2 * DAY, max_id=5)
+
+    out_ts, out, mask, meta = archive.read()
+    # Nada del día 0 se sobrescribe: queda como hueco y se anota para leerlo de la base de datos
+    assert meta["sql_ranges"] == [[T0, T0 + DAY]]
+    assert not mask[:DAY // STEP_SECONDS].any()
+    assert np.array_equal(out_ts[mask], ts1)
+    assert np.array_equal(out["slrw_avg"][mask], values1["slrw_avg"])
+
+
+def test_interrupted_append_is_discarded(tmp_path):
+    archive = ColumnarArchive(str(tmp_path), ("slrw_avg",))
+    ts, values = _samples(0, 1)
+    archive.append(ts, values, end=T0 + DAY, max_id=1)
+    # Bytes huérfanos de una compactación que no llegó a actualizar meta.json
+    with open(tmp_path / "slrw_avg.f64", "ab") as f:
+        f.write(b"\x00" * 80)
+    archive.append(*_samples(1, 1), end=T0 + 2 * DAY, max_id=2)
+    assert (tmp_path / "slrw_avg.f64").stat().st_size == 2 * DAY // STEP_SECONDS * 8
+    assert archive.read()[1]["slrw_avg"][DAY // STEP_SECONDS] == 0.0
+
+
+def _read_all():
+    return db_utils.get_solar_data(column=["slrw_avg", "slrw_2_avg"], as_arrays=True, epoch=True)
+
+
+def _insert(rows):
+    db_utils.backend.bulk_load("solar_data", pd.DataFrame(rows, columns=["timestamp", "slrw_avg", "slrw_2_avg"]))
+
+
+def test_get_solar_data_combines_archive_and_db(tmp_path, monkeypatch):
+    expected = _read_all()
+    last_day = np.datetime64(int(expected["timestamp"].max()), "s").astype("datetime64[D]")
+
+    monkeypatch.setattr(db_utils, "archive", ColumnarArchive(str(tmp_path), db_utils.SOLAR_COLUMNS))
+    # Con ARCHIVE_LAG_DAYS = 1 el último día todavía no se archiva
+    monkeypatch.setattr(db_utils, "ARCHIVE_LAG_DAYS", 1)
+    assert db_utils.compact_archive(now=str(last_day + 1)) > 0
+    assert db_utils.archive.end == int(last_day.astype("datetime64[s]").astype(np.int64))
+    combined = _read_all()
+
+    assert np.array_equal(combined["timestamp"], expected["timestamp"])
+    assert np.array_equal(combined["slrw_avg"], expected["slrw_avg"])
+    assert np.array_equal(combined["slrw_2_avg"], expected["slrw_2_avg"])
+
+    # Un rango que empieza y termina a mitad de ranura devuelve lo mismo que la base de datos
+    start, end = expected["timestamp"][3] - 1, expected["timestamp"][40] + 1
+    bounds = [str(np.datetime64(int(t), "s")).replace("T", " ") for t in (start, end)]
+    monkeypatch.setattr(db_utils, "archive", None)
+    direct = db_utils.get_solar_data(*bounds, column="slrw_avg", as_arrays=True, epoch=True)
+    monkeypatch.setattr(db_utils, "archive", ColumnarArchive(str(tmp_path), db_utils.SOLAR_COLUMNS))
+    ranged = db_utils.get_solar_data(*bounds, column="slrw_avg", as_arrays=True, epoch=True)
+    assert np.array_equal(ranged["timestamp"], direct["timestamp"])
+    assert np.array_equal(ranged["slrw_avg"], direct["slrw_avg"])
+
+
+def test_late_and_sub_interval_rows_are_not_lost(tmp_path, monkeypatch):
+    first = np.datetime64(int(_read_all()["timestamp"].min()), "s").astype("datetime64[D]")
+    # Días anteriores a los datos de ejemplo: uno cada 5 minutos y otro con timestamps fuera de rejilla
+    dense_day = pd.Timestamp(first - 3)
+    offgrid_day = pd.Timestamp(first - 2)
+    dense = [(dense_day + pd.Timedelta(minutes=5 * i), 100.0, 95.0) for i in range(288)]
+    offgrid = [(offgrid_day + pd.Timedelta(seconds=600 * i + 37), 200.0, 190.0) for i in range(144)]
+    _insert(dense + offgrid)
+    try:
+        expected = _read_all()
+        monkeypatch.setattr(db_utils, "archive", ColumnarArchive(str(tmp_path), db_utils.SOLAR_COLUMNS))
+        monkeypatch.setattr(db_utils, "ARCHIVE_LAG_DAYS", 0)
+        db_utils.compact_archive(now=str(first))
+        combined = _read_all()
+        assert np.array_equal(combined["timestamp"], expected["timestamp"])
+        assert combined["slrw_avg"].sum() == pytest.approx(expected["slrw_avg"].sum())
+
+        # Fila tardía para un día ya archivado: se lee de la base de datos antes y después de compactar
+        late = offgrid_day + pd.Timedelta(hours=12, seconds=1)
+        _insert([(late, 300.0, 285.0)])
+        late_epoch = int(late.timestamp())
+        for _ in range(2):
+            combined = _read_all()
+            assert len(combined["timestamp"]) == len(expected["timestamp"]) + 1
+            assert late_epoch in combined["timestamp"]
+            assert np.all(np.diff(combined["timestamp"]) >= 0)
+            db_utils.compact_archive(now=str(first))
+        day = int(offgrid_day.timestamp())
+        assert any(a <= day and day + DAY <= b for a, b in db_utils.archive.meta()["sql_ranges"])
+    finally:
+        with db_utils.engine.begin() as conn:
+            conn.execute(text("DELETE FROM solar_data WHERE timestamp < :first"),
+                         {"first": str(pd.Timestamp(first))})
+
+
+def test_date_only_bounds_match_with_and_without_archive(tmp_path, monkeypatch):
+    first = np.datetime64(int(_read_all()["timestamp"].min()), "s").astype("datetime64[D]")
+    day = pd.Timestamp(first - 5)
+    # Tres días en la rejilla de 10 minutos y una fila con microsegundos al final del rango
+    rows = [(day + pd.Timedelta(minutes=10 * i), float(i), 1.0) for i in range(3 * 144)]
+    rows.append((day + pd.Timedelta(days=1, hours=23, minutes=59, seconds=59, microseconds=500000), 7.0, 1.0))
+    _insert(rows)
+    bounds = (str(day.date()), str((day + pd.Timedelta(days=2)).date()))
+    try:
+        monkeypatch.setattr(db_utils, "archive", None)
+        direct = db_utils.get_solar_data(*bounds, column="slrw_avg", as_arrays=True, epoch=True)
+        # El extremo final es inclusivo: entra la muestra de las 00:00 del último día
+        assert len(direct["timestamp"]) == 2 * 144 + 2
+
+        monkeypatch.setattr(db_utils, "archive", ColumnarArchive(str(tmp_path), db_utils.SOLAR_COLUMNS))
+        monkeypatch.setattr(db_utils, "ARCHIVE_LAG_DAYS", 0)
+        db_utils.compact_archive(now=str(first))
+        archived = db_utils.get_solar_data(*bounds, column="slrw_avg", as_arrays=True, epoch=True)
+        assert np.array_equal(archived["timestamp"], direct["timestamp"])
+        assert np.array_equal(archived["slrw_avg"], direct["slrw_avg"])
+    finally:
+        with db_utils.engine.begin() as conn:
+            conn.execute(text("DELETE FROM solar_data WHERE timestamp < :first"),
+                         {"first": str(pd.Timestamp(first))})
@@ -0,0 +1,64 @@
+"""
+Pruebas de los modos de lectura de get_solar_data
+"""
+
+import numpy as np
+import pytest
+from sqlalchemy import text
+
+import db_utils
+from archive import ColumnarArchive
+from db_utils import engine, get_solar_data, iter_solar_data
+
+
+def test_multi_column_compact_frame():
+    df = get_solar_data(column=["slrw_avg", "slrw_2_avg"], float32=True)
+    assert list(df.columns) == ["timestamp", "slrw_avg", "slrw_2_avg"]
+    assert df["timestamp"].dtype == np.dtype("datetime64[s]")
+    assert df["slrw_avg"].dtype == np.float32
+    assert df["timestamp"].is_monotonic_increasing
+
+
+def test_array_and_epoch_modes():
+    data = get_solar_data(as_arrays=True, epoch=True)
+    assert set(data) == {"timestamp", "slrw_avg"}
+    assert data["timestamp"].dtype == np.int64
+    df = get_solar_data()
+    assert np.array_equal(data["timestamp"].astype("datetime64[s]"), df["timestamp"].to_numpy())
+    assert np.allclose(data["slrw_avg"], df["slrw_avg"].to_numpy())
+
+
+def test_iter_matches_full_read():
+    chunks = list(iter_solar_data(column="slrw_2_avg", chunksize=50, as_arrays=True))
+    total = np.concatenate([c["slrw_2_avg"] for c in chunks])
+    assert np.allclose(total, get_solar_data(column="slrw_2_avg")["slrw_2_avg"].to_numpy())
+
+
+def test_invalid_column_rejected():
+    with pytest.raises(ValueError):
+        get_solar_data(column="slrw_avg; DROP TABLE solar_data")
+
+
+def test_non_string_column_rejected():
+    with pytest.raises(ValueError):
+        get_solar_data(column=None)
+
+
+def test_unparseable_timestamps_skipped(tmp_path, monkeypatch):
+    expected = get_solar_data(as_arrays=True, epoch=True)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO solar_data (timestamp, slrw_avg, slrw_2_avg) "
+                          "VALUES ('01/01/2024 10:00', 500, 475)"))
+    try:
+        data = get_solar_data(as_arrays=True, epoch=True)
+        assert np.array_equal(data["timestamp"], expected["timestamp"])
+        chunks = list(iter_solar_data(chunksize=50, as_arrays=True, epoch=True))
+        assert np.array_equal(np.concatenate([c["timestamp"] for c in chunks]), expected["timestamp"])
+        # La compactación tampoco se bloquea por la fila inválida
+        monkeypatch.setattr(db_utils, "archive", ColumnarArchive(str(tmp_path), db_utils.SOLAR_COLUMNS))
+        monkeypatch.setattr(db_utils, "ARCHIVE_LAG_DAYS", 0)
+        last_day = np.datetime64(int(expected["timestamp"].max()), "s").astype("datetime64[D]")
+        assert db_utils.compact_archive(now=str(last_day)) > 0
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text("DELETE FROM solar_data WHERE timestamp = '01/01/2024 10:00'"))
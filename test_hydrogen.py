@@ -0,0 +1,51 @@
+"""
+Pruebas del modelo vectorizado de producción de hidrógeno
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from hydrogen import (HORAS_INTERVALO, H2_LHV_KWH_KG, electrolyzer_h2_kg, estimate_hydrogen,
+                      hydrogen_production, pv_power_kw)
+
+
+def test_pv_power_matches_efficiency_api():
+    # 1000 W/m² * 2 m² * 15% a 25 °C = 300 W
+    assert np.isclose(pv_power_kw(1000, 2, 0.15), 0.3)
+    assert np.isclose(pv_power_kw(1000, 2, 0.15, temperature=35), 0.3 * 0.96)
+
+
+def test_electrolyzer_limits():
+    h2 = electrolyzer_h2_kg(np.array([0.0, 0.01, 0.25, 1.0]), rated_power_kw=0.25, min_load=0.1)
+    assert h2[0] == 0 and h2[1] == 0          # Bajo la carga mínima
+    assert h2[2] == h2[3]                     # Recortado a la potencia nominal
+    assert np.isclose(h2[2], 0.25 * HORAS_INTERVALO * 0.61 / H2_LHV_KWH_KG)
+
+
+def test_estimate_daily_and_monthly_totals():
+    timestamps = pd.date_range("2024-01-31 00:00", periods=288, freq="10min")
+    df = pd.DataFrame({"timestamp": timestamps, "slrw_avg": np.full(288, 800.0)})
+    result = estimate_hydrogen(df)
+    assert len(result['daily']) == 2
+    assert len(result['monthly']) == 2
+    assert np.isclose(result['daily'].sum(), result['total_kg'])
+    assert np.isclose(result['monthly'].sum(), result['total_kg'])
+    assert result['operating_hours'] == 48
+
+
+def test_cached_production_keeps_only_aggregates():
+    result = hydrogen_production()
+    assert 'intervals' not in result
+    assert result['total_kg'] > 0
+    assert np.isclose(result['daily'].sum(), result['total_kg'])
+
+
+def test_invalid_parameters_rejected():
+    df = pd.DataFrame({"timestamp": pd.date_range("2024-01-01", periods=3, freq="10min"),
+                       "slrw_avg": [500.0, 800.0, 0.0]})
+    for params in ({"rated_power_kw": 0}, {"min_load": 1.5}, {"panel_area": -1}, {"rated_power_kw": "abc"}):
+        with pytest.raises(ValueError):
+            estimate_hydrogen(df, **params)
+    with pytest.raises(ValueError):
+        electrolyzer_h2_kg(np.array([1.0]), rated_power_kw=0, min_load=0.1)
@@ -0,0 +1,88 @@
+"""
+Pruebas del planificador en proceso y de los KPIs materializados
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+
+import scheduler as sched
+from app import app
+from db_utils import engine, get_kpis, refresh_kpis
+
+
+def test_single_leader(tmp_path):
+    lock = str(tmp_path / "scheduler.lock")
+    first, second = sched.Scheduler(lock_path=lock), sched.Scheduler(lock_path=lock)
+    assert first.acquire_leadership()
+    if sched.fcntl:
+        assert not second.acquire_leadership()
+        assert second.run_pending() == []
+    first.release_leadership()
+    assert second.acquire_leadership()
+    second.release_leadership()
+
+
+def test_run_pending_records_runs(tmp_path):
+    calls = []
+    scheduler = sched.Scheduler(lock_path=str(tmp_path / "scheduler.lock"))
+    scheduler.add_job("test_ok", lambda: calls.append(1), interval=60)
+    scheduler.add_job("test_error", lambda: 1 / 0, interval=60)
+
+    assert scheduler.run_pending(now=1000) == ["test_ok", "test_error"]
+    assert scheduler.run_pending(now=1030) == []
+    assert scheduler.run_pending(now=1060) == ["test_ok", "test_error"]
+    scheduler.release_leadership()
+    assert len(calls) == 2
+
+    runs = {job["name"]: job for job in sched.get_job_runs()}
+    assert runs["test_ok"]["status"] == "ok" and runs["test_ok"]["runs"] >= 2
+    assert runs["test_error"]["status"] == "error" and "division" in runs["test_error"]["error"]
+
+
+def test_next_run_resumes_from_recorded_start(tmp_path):
+    lock = str(tmp_path / "scheduler.lock")
+    first = sched.Scheduler(lock_path=lock)
+    first.add_job("test_resume", lambda: None, interval=60)
+    assert first.run_pending(now=5000) == ["test_resume"]
+    first.release_leadership()
+
+    # Un nuevo líder (reinicio o cambio de worker) no repite la tarea antes de tiempo
+    second = sched.Scheduler(lock_path=lock)
+    second.add_job("test_resume", lambda: None, interval=60)
+    assert second.run_pending(now=5030) == []
+    assert second.run_pending(now=5060) == ["test_resume"]
+    second.release_leadership()
+
+
+def test_daily_jobs_aligned_to_midnight():
+    started = datetime(2024, 3, 10, 15, 42).timestamp()
+    assert sched.next_run_after(started, 86400) == datetime(2024, 3, 11).timestamp()
+    assert sched.next_run_after(started, 2 * 86400) == datetime(2024, 3, 12).timestamp()
+    assert sched.next_run_after(started, 600) == started + 600
+
+
+def test_kpi_snapshot_single_row():
+    kpis = refresh_kpis()
+    stored = get_kpis()
+    assert stored["avg_irradiance"] == pytest.approx(kpis["avg_irradiance"])
+    assert stored["total_energy"] == pytest.approx(kpis["total_energy"])
+    assert stored["max_irradiance"] >= stored["avg_irradiance"] > 0
+
+
+def test_home_refreshes_stale_kpis():
+    refresh_kpis()
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE kpi_snapshot SET updated_at = '2000-01-01 00:00:00', avg_irradiance = -1"))
+    assert app.test_client().get("/").status_code == 200
+    stored = get_kpis()
+    assert stored["avg_irradiance"] > 0 and not str(stored["updated_at"]).startswith("2000")
+
+    # Recién vencido el intervalo (antes del siguiente tick) se sigue usando la fila materializada
+    just_due = datetime.now() - timedelta(seconds=sched.KPI_INTERVAL + sched.TICK_SECONDS // 2)
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE kpi_snapshot SET updated_at = :at, avg_irradiance = -1"),
+                     {"at": just_due.isoformat(sep=" ", timespec="seconds")})
+    assert app.test_client().get("/").status_code == 200
+    assert get_kpis()["avg_irradiance"] == -1
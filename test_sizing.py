@@ -0,0 +1,67 @@
+"""
+Pruebas del barrido de dimensionamiento y del frente de Pareto
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import sizing
+from hydrogen import HORAS_INTERVALO
+
+
+def _history(days=3):
+    timestamps = pd.date_range("2024-06-01", periods=144 * days, freq="10min").to_numpy()
+    hour = (timestamps - timestamps.astype('datetime64[D]')).astype('timedelta64[m]').astype(float) / 60
+    irradiance = np.clip(1000 * np.sin((hour - 6) * np.pi / 12), 0, None)
+    doy, hour = sizing._geometry(timestamps)
+    return irradiance, doy, hour
+
+
+def test_pareto_front():
+    energy = np.array([10.0, 12.0, 9.0, 15.0, 15.0])
+    cost = np.array([100.0, 100.0, 120.0, 200.0, 250.0])
+    assert sorted(sizing.pareto_front(energy, cost)) == [1, 3]
+
+
+def test_horizontal_tilt_matches_base_model():
+    irradiance, doy, hour = _history()
+    energy = sizing.evaluate_grid(irradiance, doy, hour, [2], [0.15], [0.0], [0])
+    assert energy.shape == (1, 1, 1, 1)
+    assert np.isclose(energy[0, 0, 0, 0], irradiance.sum() * 2 * 0.15 * HORAS_INTERVALO / 1000)
+
+
+def test_tilt_toward_equator_in_both_hemispheres():
+    # Equinoccio (declinación 0) al mediodía: el panel inclinado a la latitud queda normal al sol
+    doy, hour = np.array([81.0]), np.array([12.0])
+    for latitude in (30, -30):
+        factor = sizing.tilt_factor([0, 30, 60], doy, hour, latitude=latitude)[:, 0]
+        assert np.allclose(factor, [1, 1 / np.cos(np.radians(30)), 1])
+
+
+def test_chunked_and_parallel_match_serial(monkeypatch):
+    irradiance, doy, hour = _history()
+    grid = ([1, 2, 4], [0.15, 0.2], [-0.005, -0.003], [0, 15, 30, 45])
+    serial = sizing.evaluate_grid(irradiance, doy, hour, *grid)
+    assert serial.shape == (3, 2, 2, 4)
+
+    monkeypatch.setattr(sizing, "CHUNK_CELLS", 100)
+    monkeypatch.setattr(sizing, "PARALLEL_CELLS", 1)
+    parallel = sizing.evaluate_grid(irradiance, doy, hour, *grid, workers=2)
+    assert np.allclose(serial, parallel)
+
+
+@pytest.mark.parametrize("grid", [
+    {'panel_areas': [float('nan')]},
+    {'panel_areas': [0]},
+    {'panel_efficiencies': [1.5]},
+    {'temp_coefficients': [float('inf')]},
+    {'tilts': [-5]},
+    {'tilts': [95]},
+])
+def test_invalid_grid_rejected(grid):
+    params = {'panel_areas': [2], 'panel_efficiencies': [0.15], 'temp_coefficients': [-0.004], 'tilts': [0], **grid}
+    with pytest.raises(ValueError):
+        sizing.validate_grid(**params)
+    with pytest.raises(ValueError):
+        sizing.optimize_sizing(**params)
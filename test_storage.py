@@ -0,0 +1,74 @@
+"""
+Pruebas del backend de almacenamiento contra SQLite y, si está disponible,
+una instancia local de PostgreSQL (TEST_POSTGRES_URL)
+"""
+
+import os
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+from sqlalchemy import text
+
+from storage import PostgresBackend, SQLiteBackend, create_backend, resolve_url
+
+
+def _backends(tmp_path):
+    backends = [create_backend(str(tmp_path / "solar_test.db"))]
+    if os.getenv("TEST_POSTGRES_URL"):
+        backends.append(create_backend(os.environ["TEST_POSTGRES_URL"]))
+    return backends
+
+
+def _sample(n):
+    base = datetime(2024, 1, 1)
+    return pd.DataFrame({
+        "timestamp": [base + timedelta(minutes=10 * i) for i in range(n)],
+        "slrw_avg": [float(i) for i in range(n)],
+    })
+
+
+def test_resolve_url():
+    assert resolve_url("solar_data.db") == "sqlite:///solar_data.db"
+    assert resolve_url("postgres://u:p@h/db") == "postgresql+psycopg2://u:p@h/db"
+    assert resolve_url("postgresql://u:p@h/db") == "postgresql+psycopg2://u:p@h/db"
+    assert isinstance(create_backend("sqlite://"), SQLiteBackend)
+
+
+def test_bulk_load_and_iter_query(tmp_path):
+    for backend in _backends(tmp_path):
+        with backend.engine.begin() as conn:
+            conn.execute(text("DROP TABLE IF EXISTS storage_test"))
+            conn.execute(text(f"""
+                CREATE TABLE storage_test (
+                    id {backend.pk_type},
+                    timestamp {backend.timestamp_type} NOT NULL,
+                    slrw_avg REAL
+                )
+            """))
+        assert backend.table_exists("storage_test")
+
+        assert backend.bulk_load("storage_test", _sample(250), chunksize=100) == 250
+
+        chunks = list(backend.iter_query(
+            "SELECT timestamp, slrw_avg FROM storage_test ORDER BY timestamp", chunksize=100
+        ))
+        assert [len(c) for c in chunks] == [100, 100, 50]
+        df = pd.concat(chunks, ignore_index=True)
+        assert df["slrw_avg"].sum() == sum(range(250))
+        assert pd.to_datetime(df["timestamp"]).iloc[-1] == datetime(2024, 1, 1) + timedelta(minutes=10 * 249)
+
+        with backend.engine.begin() as conn:
+            conn.execute(text("DROP TABLE storage_test"))
+
+
+@pytest.mark.skipif(not os.getenv("TEST_POSTGRES_URL"), reason="TEST_POSTGRES_URL no configurada")
+def test_postgres_backend_selected():
+    assert isinstance(create_backend(os.environ["TEST_POSTGRES_URL"]), PostgresBackend)
+
+
+@pytest.mark.parametrize("url", ["postgresql+psycopg://usuario@localhost/solar",
+                                 "postgresql+asyncpg://usuario@localhost/solar"])
+def test_unsupported_postgres_driver_rejected(url):
+    with pytest.raises(ValueError):
+        create_backend(url)